@@ -1,12 +1,35 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from datetime import datetime
 import logging
 from functools import wraps
+import hashlib
 import json
 from pathlib import Path
-import requests
-import time
-from typing import List, Dict, Any, Optional
+from urllib.parse import urlencode
+import aiohttp
+import asyncio
+import math
+import random
+from itertools import islice
+from typing import List, Dict, Any, FrozenSet, Iterator, Mapping, NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:  # orjson не установлен - используем стандартный json
+    loads = json.loads
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+try:
+    from aiohttp_client_cache import CachedSession, SQLiteBackend
+except ImportError:  # дисковый HTTP-кэш не установлен - работаем без него
+    CachedSession = None
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
@@ -14,8 +37,46 @@ logger = logging.getLogger(__name__)
 # HH API URL
 url = "https://api.hh.ru/vacancies"
 
+# Параметры поиска, общие для всех страниц выдачи
+BASE_PARAMS = {
+    "text": "python OR SQL OR fastapi",
+    "per_page": 100,
+    "area": 1,
+    "only_with_salary": "true",
+}
+
+# HH API отдаёт не больше 2000 вакансий на запрос (20 страниц по 100)
+MAX_PAGES = 20
+
+# Общие заголовки и размер пула соединений для всех запросов к HH
+SESSION_HEADERS = {
+    "User-Agent": "hh-hunter/1.0",
+    # JSON со страницы в 100 вакансий хорошо сжимается; aiohttp распаковывает ответ сам
+    "Accept-Encoding": "gzip, deflate",
+}
+POOL_SIZE = 10
+
+# Дисковый кэш ответов (если установлен aiohttp-client-cache): повторные запуски в течение
+# HTTP_CACHE_EXPIRE секунд не ходят в HH, а рабочий сбор всё равно получает свежие данные
+HTTP_CACHE_FILE = Path("./data/http_cache.sqlite")
+HTTP_CACHE_EXPIRE = 1800
+
+# Не больше MAX_CONCURRENCY запросов одновременно и пауза между запросами одного слота
+MAX_CONCURRENCY = 5
+REQUEST_INTERVAL = 0.2
+
+# Верхняя граница ожидания по Retry-After: страница держит слот семафора всё это время
+MAX_RETRY_AFTER = 30.0
+
+# Кэш ETag/Last-Modified по страницам и каталог с сохранёнными ответами
+ETAG_CACHE_FILE = Path("./data/etag_cache.json")
+PAGES_DIR = Path("./data/pages")
+
 @dataclass
 class VacancyData:
+    # __slots__ вместо dataclass(slots=True), чтобы сохранить поддержку Python 3.7+
+    __slots__ = ('title', 'url', 'salary_from', 'salary_to', 'salary_currency', 'salary_gross', 'retrieved_at')
+
     title: str
     url: str
     salary_from: Optional[int]
@@ -24,72 +85,91 @@ class VacancyData:
     salary_gross: Optional[bool]
     retrieved_at: str
 
-    @classmethod
-    def api_response(cls, vacancy_data: Dict[str, Any]) -> Optional['VacancyData']:
-        try:
-            title = vacancy_data.get('name','')
-            url = vacancy_data.get('alternate_url', '')
-            
-            salary_info = vacancy_data.get('salary')
-            salary_from = salary_info.get('from') if salary_info else None
-            salary_to = salary_info.get('to') if salary_info else None
-            salary_currency = salary_info.get('currency') if salary_info else None
-            salary_gross = salary_info.get('gross') if salary_info else None
-
-            retrieved_at = datetime.now().isoformat()
-
-            return cls(
-                title = title,
-                url = url,
-                salary_from = salary_from,
-                salary_to = salary_to,
-                salary_currency = salary_currency,
-                salary_gross = salary_gross,
-                retrieved_at = retrieved_at
-            )
 
-        except Exception as e:
-            logger.error(f"Ошибка при создании VacancyData: {e}")
-            return None
+class VacancyBatch:
+    # Вакансии хранятся по колонкам (по списку на каждое поле VacancyData),
+    # а не списком объектов - при тысячах записей это заметно экономит память
+    __slots__ = VacancyData.__slots__
+
+    def __init__(self):
+        for column in self.__slots__:
+            setattr(self, column, [])
+
+    def append(self, title: str, url: str, salary_from: Optional[int], salary_to: Optional[int],
+               salary_currency: Optional[str], salary_gross: Optional[bool], retrieved_at: str) -> None:
+        self.title.append(title)
+        self.url.append(url)
+        self.salary_from.append(salary_from)
+        self.salary_to.append(salary_to)
+        self.salary_currency.append(salary_currency)
+        self.salary_gross.append(salary_gross)
+        self.retrieved_at.append(retrieved_at)
+
+    def extend(self, other: 'VacancyBatch') -> None:
+        for column in self.__slots__:
+            getattr(self, column).extend(getattr(other, column))
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        return zip(*(getattr(self, column) for column in self.__slots__))
+
+    def __len__(self) -> int:
+        return len(self.title)
+
+    def __iter__(self) -> Iterator[VacancyData]:
+        for row in self.rows():
+            yield VacancyData(*row)
+
+# Статусы, при которых запрос имеет смысл повторить
+DEFAULT_RETRYABLE = frozenset({429, 500, 502, 503, 504})
+
 def retry_request(
     max_retries: int = 3,
     initial_delay: float = 1.0,
     backoff_factor: float = 2.0,
-    retryable_status_codes: List[int] = [429, 500, 502, 503, 504]
+    retryable_status_codes: FrozenSet[int] = DEFAULT_RETRYABLE
 ):
     def decorator(func: callable):
         @wraps(func)
-        def wrapper(*args, **kwargs):
+        async def wrapper(*args, **kwargs):
             retries = 0
             delay = initial_delay
             
             while retries <= max_retries:
+                retry_after = None
                 try:
-                    result = func(*args, **kwargs)
+                    result = await func(*args, **kwargs)
                     
                     # Если функция возвращает response объект
-                    if hasattr(result, 'status_code'):
-                        if result.status_code == 200:
+                    if hasattr(result, 'status'):
+                        if result.status in (200, 304):
                             return result
-                        elif result.status_code in retryable_status_codes:
-                            logger.warning(f"Получен статус {result.status_code}, попытка {retries + 1}/{max_retries}")
+                        elif result.status in retryable_status_codes:
+                            logger.warning("Получен статус %d, попытка %d/%d", result.status, retries + 1, max_retries)
+                            if result.status in (429, 503):
+                                retry_after = result.headers.get("Retry-After")
                         else:
-                            return result  # Не retry-able ошибка
+                            # Не retry-able ошибка: вызывающий код получает None, как и после исчерпания попыток
+                            logger.error("Получен статус %d, повтор не имеет смысла", result.status)
+                            return None
                     else:
                         return result  # Если функция возвращает не response
                         
-                except (requests.exceptions.RequestException, 
-                       requests.exceptions.Timeout,
-                       requests.exceptions.ConnectionError) as e:
-                    logger.warning(f"Ошибка сети: {e}, попытка {retries + 1}/{max_retries}")
+                except (aiohttp.ClientError, 
+                       asyncio.TimeoutError) as e:
+                    logger.warning("Ошибка сети: %s, попытка %d/%d", e, retries + 1, max_retries)
                 
                 # Если достигли максимума попыток, выходим
                 if retries == max_retries:
-                    logger.error(f"Превышено максимальное количество попыток ({max_retries})")
+                    logger.error("Превышено максимальное количество попыток (%d)", max_retries)
                     return None
                 
-                # Ждем перед следующей попыткой (экспоненциальная backoff задержка)
-                time.sleep(delay)
+                # Ждем перед следующей попыткой: сколько просит сервер в Retry-After,
+                # иначе экспоненциальная backoff задержка со случайным разбросом
+                if retry_after and retry_after.isdigit():
+                    wait = min(float(retry_after), MAX_RETRY_AFTER)
+                else:
+                    wait = delay + random.uniform(0, delay * 0.3)
+                await asyncio.sleep(wait)
                 delay *= backoff_factor
                 retries += 1
                 
@@ -97,131 +177,239 @@ def retry_request(
         return wrapper
     return decorator
 
+class HttpResult(NamedTuple):
+    # Ответ, полностью прочитанный внутри make_request: после выхода из контекста
+    # aiohttp освобождает соединение, и повторный response.read() уже недоступен
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+
 @retry_request(max_retries=3, initial_delay=1.0, backoff_factor=2.0)
-def make_request(url: str, params: Dict[str, Any]) -> Optional[requests.Response]:
-    return requests.get(url, params=params, timeout=10)
+async def make_request(session: aiohttp.ClientSession, url: str, params: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Optional[HttpResult]:
+    async with session.get(url, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as response:
+        # Читаем тело внутри контекста (и внутри retry_request), чтобы соединение вернулось в пул
+        body = await response.read()
+        return HttpResult(response.status, response.headers, body)
 
 
-def fetch_hh_vac(url: str, page: int) -> Optional[Dict[str, Any]]:
+def load_etag_cache() -> Dict[str, Dict[str, str]]:
+    try:
+        etag_cache = loads(ETAG_CACHE_FILE.read_bytes())
+    except (OSError, ValueError):
+        return {}
 
-    query_params = {
-        "text": "python OR SQL OR fastapi",
-        "per_page": 100,
-        "page": page,
-        "area": 1,
-        "only_with_salary": True,
+    # Файл мог быть повреждён или записан старой версией - оставляем только корректные записи
+    if not isinstance(etag_cache, dict):
+        return {}
+    return {
+        key: entry for key, entry in etag_cache.items()
+        if isinstance(entry, dict) and isinstance(entry.get("body_path"), str)
     }
-    
+
+
+def save_etag_cache(etag_cache: Dict[str, Dict[str, str]]) -> None:
     try:
-        response = make_request(url, query_params)
-        
-        if not response:
-            logger.error(f"Не удалось выполнить запрос для страницы {page}")
-            return None
-        
-        if response.status_code != 200:
-            logger.error(f"Ошибка HTTP {response.status_code} для страницы {page}")
-            return None
-        
-        logger.info(f"Вакансии успешно со страницы {page+1} получены!")
-        return response.json()
-        
-    except requests.exceptions.Timeout:
-        logger.error(f"Таймаут запроса для страницы {page}")
+        ETAG_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        ETAG_CACHE_FILE.write_bytes(dumps(etag_cache))
+    except OSError as e:
+        logger.error("Ошибка при сохранении кэша ETag: %s", e)
+
+
+def conditional_headers(entry: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    if not entry or not entry.get("body_path") or not Path(entry["body_path"]).exists():
         return None
-    except json.JSONDecodeError as e:
-        logger.error(f"Ошибка парсинга JSON для страницы {page}: {e}")
+
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers or None
+
+
+async def fetch_hh_vac(session: aiohttp.ClientSession, url: str, page: int, etag_cache: Optional[Dict[str, Dict[str, str]]] = None) -> Optional[Dict[str, Any]]:
+
+    query_params = {**BASE_PARAMS, "page": page}
+    # Ключ включает все параметры запроса: после смены текста поиска старые ETag не используются
+    cache_key = urlencode(sorted(query_params.items()))
+    entry = etag_cache.get(cache_key) if etag_cache is not None else None
+
+    # Статус и сетевые ошибки уже проверены в retry_request: здесь либо 200/304, либо None
+    response = await make_request(session, url, query_params, conditional_headers(entry))
+    if response is None:
+        logger.error("Не удалось выполнить запрос для страницы %d", page)
         return None
-    except Exception as e:
-        logger.error(f"Неожиданная ошибка для страницы {page}: {e}")
+    
+    # Страница не изменилась с прошлого запуска - берём ответ с диска
+    if response.status == 304 and entry:
+        logger.info("Страница %d не изменилась, используем кэш", page + 1)
+        try:
+            body = Path(entry["body_path"]).read_bytes()
+        except OSError as e:
+            # Запись в кэше больше не годится - на следующем запуске страница придёт целиком
+            logger.error("Не удалось прочитать кэш страницы %d: %s", page, e)
+            etag_cache.pop(cache_key, None)
+            return None
+    else:
+        body = response.body
+        if etag_cache is not None and (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            # Имя файла тоже от ключа, чтобы ответы разных запросов не перезаписывали друг друга
+            body_path = PAGES_DIR / f"{hashlib.sha1(cache_key.encode()).hexdigest()}.json"
+            try:
+                body_path.parent.mkdir(parents=True, exist_ok=True)
+                body_path.write_bytes(body)
+                etag_cache[cache_key] = {
+                    "etag": response.headers.get("ETag", ""),
+                    "last_modified": response.headers.get("Last-Modified", ""),
+                    "body_path": str(body_path),
+                }
+            except OSError as e:
+                logger.error("Ошибка при сохранении страницы %d в кэш: %s", page, e)
+        logger.info("Вакансии успешно со страницы %d получены!", page + 1)
+
+    # ValueError покрывает ошибки и orjson, и json (включая UnicodeDecodeError на байтах)
+    try:
+        return loads(body)
+    except ValueError as e:
+        logger.error("Ошибка парсинга JSON для страницы %d: %s", page, e)
         return None
 
-def extract_vacancy_data(vacancies: List[Dict[str, Any]]) -> List[VacancyData]:
-    structured_data = []
 
+def create_session() -> aiohttp.ClientSession:
+    # Одна сессия на весь запуск: keep-alive соединения переиспользуются между страницами
+    connector = aiohttp.TCPConnector(limit=POOL_SIZE, limit_per_host=POOL_SIZE)
+    if CachedSession is None:
+        return aiohttp.ClientSession(connector=connector, headers=SESSION_HEADERS)
+
+    HTTP_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    cache = SQLiteBackend(str(HTTP_CACHE_FILE), expire_after=HTTP_CACHE_EXPIRE, allowed_codes=(200,))
+    return CachedSession(cache=cache, connector=connector, headers=SESSION_HEADERS)
+
+
+async def fetch_page(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, url: str, page: int, etag_cache: Optional[Dict[str, Dict[str, str]]] = None) -> Tuple[Optional[Dict[str, Any]], str]:
+    # Ограничиваем число одновременных запросов, чтобы не получать 429 от HH
+    async with semaphore:
+        # Сетевая ошибка вне retry_request не должна обрывать asyncio.gather по всем страницам
+        try:
+            vacancies = await fetch_hh_vac(session, url, page, etag_cache)
+        except aiohttp.ClientError as e:
+            logger.error("Ошибка сети для страницы %d: %s", page, e)
+            vacancies = None
+        # Все вакансии страницы получены одним ответом - время фиксируем сразу после него
+        retrieved_at = datetime.now().isoformat()
+        # Слот освобождается только после паузы, как sleep(0.2) в последовательной версии
+        await asyncio.sleep(REQUEST_INTERVAL)
+        return vacancies, retrieved_at
+
+def extract_and_filter(vacancies: List[Dict[str, Any]], min_salary: int, retrieved_at: str) -> VacancyBatch:
+    structured_data = VacancyBatch()
+
+    # Фильтруем по зарплате ещё на сырых словарях, в колонки пишем только подходящие
     for vacancy in vacancies:
-        vacancy_data = VacancyData.api_response(vacancy)
-        if vacancy_data:
-            structured_data.append(vacancy_data)
+        salary_info = vacancy.get('salary') or {}
+        salary_from = salary_info.get('from')
+        salary_to = salary_info.get('to')
+        if (salary_from and salary_from >= min_salary) or \
+           (salary_to and salary_to >= min_salary):
+            structured_data.append(
+                vacancy.get('name', ''),
+                vacancy.get('alternate_url', ''),
+                salary_from,
+                salary_to,
+                salary_info.get('currency'),
+                salary_info.get('gross'),
+                retrieved_at
+            )
     
     return structured_data
 
+def collect_page(vacancies: Optional[Dict[str, Any]], page: int, min_salary: int, retrieved_at: str) -> VacancyBatch:
+    if not vacancies or 'items' not in vacancies:
+        logger.warning("Не удалось получить данные для страницы %d", page)
+        return VacancyBatch()
+        
+    current_vacancies = vacancies.get('items', [])
+    if not current_vacancies:
+        logger.warning("Отсутствует ключ 'items' в ответе для страницы %d", page)
+        return VacancyBatch()
 
+    # Структурируем и фильтруем по зарплате за один проход
+    try:
+        return extract_and_filter(current_vacancies, min_salary, retrieved_at)
+    except Exception as e:
+        logger.error("Некорректные данные вакансий на странице %d: %s", page, e)
+        return VacancyBatch()
 
-def filter_by_salary(vacancies: List[Dict[str, Any]], min_salary: int) -> List[Dict[str, Any]]:
-    filtered = []
-    for vacancy in vacancies:
-        if (vacancy.salary_from and vacancy.salary_from >= min_salary) or \
-           (vacancy.salary_to and vacancy.salary_to >= min_salary):
-            filtered.append(vacancy)
-    
-    return filtered
+def count_pages(first_page: Optional[Dict[str, Any]]) -> int:
+    if not first_page:
+        return 0
 
-def fetch_all(url: str, min_salary: int = 250000) -> List[VacancyData]:
-    
-    page = 0
-    all_vacancies = []
+    per_page = BASE_PARAMS["per_page"]
+    # Неполная первая страница - значит, других страниц нет
+    if len(first_page.get('items', [])) < per_page:
+        return 1
 
-    while True:
-        vacancies = fetch_hh_vac(url, page)
-        
-        if not vacancies or 'items' not in vacancies:
-            logger.warning(f"Не удалось получить данные для страницы {page}")
-            break
-            
-        current_vacancies = vacancies.get('items', [])
-        if not current_vacancies:
-            logger.warning(f"Отсутствует ключ 'items' в ответе для страницы {page}")
-            break
+    # Точное число страниц считаем по found, чтобы не запрашивать лишние
+    found = first_page.get('found')
+    pages = math.ceil(found / per_page) if found is not None else first_page.get('pages', 0)
+    return min(pages, MAX_PAGES)
 
-        # Структурируем данные 
-        structured_vacancies = extract_vacancy_data(current_vacancies)
-        
-        # Фильтруем по зарплате
-        filtered_vacancies = filter_by_salary(structured_vacancies, min_salary)
-        all_vacancies.extend(filtered_vacancies)
-
-        # Проверяем, есть ли следующая страница
-        pages = vacancies.get('pages', 0)
-        if page >= pages - 1 or page >= 19:  # HH API ограничивает 2000 вакансий (20 страниц)
-            logger.info(f"Достигнут предел страниц ({pages})")
-            break
-            
-        page += 1
-        time.sleep(0.2) 
+async def fetch_all_async(url: str, min_salary: int = 250000) -> VacancyBatch:
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    etag_cache = load_etag_cache()
+
+    async with create_session() as session:
+        # Первая страница сообщает общее количество страниц
+        first, retrieved_at = await fetch_page(session, semaphore, url, 0, etag_cache)
+        all_vacancies = collect_page(first, 0, min_salary, retrieved_at)
+
+        pages = count_pages(first)
+        logger.info("Всего страниц к загрузке: %d", pages)
+
+        # Остальные страницы запрашиваем параллельно и сразу все, без проб
+        results = await asyncio.gather(*(fetch_page(session, semaphore, url, page, etag_cache) for page in range(1, pages)))
+
+    save_etag_cache(etag_cache)
+
+    for page, (vacancies, retrieved_at) in enumerate(results, start=1):
+        all_vacancies.extend(collect_page(vacancies, page, min_salary, retrieved_at))
 
     return all_vacancies
 
-def save_to_file(vacancies: List[Dict[str, Any]], filename: str = "./data/vacancies_data.json") -> None:
+def save_to_file(vacancies: VacancyBatch, filename: str = "./data/vacancies_data.json") -> None:
     try:
         # Создаём директорию, если она не существует
         Path(filename).parent.mkdir(parents=True, exist_ok=True)
         
-        # Преобразуем датаклассы в словари 
-        vacancies_dict = [asdict(vacancy) for vacancy in vacancies]
-
-        with open(filename, "w", encoding="utf-8") as file:
-            json.dump(vacancies_dict, file, ensure_ascii=False, indent=2)
+        # Пишем JSON-массив по одной вакансии, не собирая список словарей целиком
+        with open(filename, "wb") as file:
+            file.write(b"[")
+            for i, row in enumerate(vacancies.rows()):
+                file.write(b",\n" if i else b"\n")
+                file.write(dumps(dict(zip(VacancyBatch.__slots__, row))))
+            file.write(b"\n]" if vacancies else b"]")
         
-        logging.info(f"Данные успешно сохранены в {filename}")
+        logger.info("Данные успешно сохранены в %s", filename)
     
     except IOError as e:
-        logging.info(f"Ошибка при сохранении файла: {e}")
+        logger.error("Ошибка при сохранении файла: %s", e)
     except Exception as e:
-        logger.error(f"Неожиданная ошибка при сохранении: {e}")
+        logger.error("Неожиданная ошибка при сохранении: %s", e)
 
 
 def main():
     logger.info("Начинаем сбор вакансий...")
     
-    vacancies = fetch_all(url, min_salary=250000) # Запрос вакансий от 250 000 р.
+    vacancies = asyncio.run(fetch_all_async(url, min_salary=250000)) # Запрос вакансий от 250 000 р.
     
     if vacancies:
-        logger.info(f"Найдено {len(vacancies)} вакансий с зарплатой от 250000 руб.")
+        logger.info("Найдено %d вакансий с зарплатой от 250000 руб.", len(vacancies))
 
-        # Пять вакансий выводим в качестве демонстрации
-        for i, vacancy in enumerate(vacancies[:5]):
-            logger.info(f"Пример {i+1}: {vacancy.title}: {vacancy.salary_from}-{vacancy.salary_to} {vacancy.salary_currency}")
+        # Пять вакансий выводим в качестве демонстрации (уровень проверяем один раз, а не на каждой строке)
+        if logger.isEnabledFor(logging.INFO):
+            for i, vacancy in enumerate(islice(vacancies, 5)):
+                logger.info("Пример %d: %s: %s-%s %s", i + 1, vacancy.title, vacancy.salary_from, vacancy.salary_to, vacancy.salary_currency)
 
         save_to_file(vacancies)
     else: